@@ -1,8 +1,60 @@
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import sqlalchemy as db
 from sqlalchemy.orm import sessionmaker
 import numpy as np
-from sklearn.metrics import mean_squared_error
+
+# Bound parameter limit of older SQLite builds; multi-row inserts must stay below it
+SQLITE_MAX_VARIABLES = 999
+
+# Test data size from which the Numba kernel outperforms NumPy despite its dispatch overhead
+NUMBA_MIN_ROWS = 1_000_000
+
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=8)
+def _load_csv(path, mtime):
+    """
+    Parses a CSV file with lowercase column names; cached per path and modification time.
+    """
+    df = pd.read_csv(path, dtype=np.float64, engine='c')  # All data files are purely numeric
+    df.columns = df.columns.str.lower()  # Convert all column names to lowercase
+    return df
+
+def _classify_deviations(aligned, ys, max_dev):
+    """
+    Finds the closest ideal function within the allowed deviation for each test point;
+    unassigned points get index -1 and an infinite deviation.
+    """
+    dev = np.abs(ys[:, None] - aligned)
+    dev[~(dev <= max_dev)] = np.inf  # Also rejects NaN deviations
+    best = dev.argmin(axis=1)
+    delta = dev[np.arange(len(ys)), best]
+    best[np.isinf(delta)] = -1
+    return best, delta
+
+@functools.lru_cache(maxsize=None)
+def _load_numba_kernel():
+    """
+    Imports the Numba deviation kernel on first use; returns None if Numba is not installed.
+    """
+    try:
+        from kernels import classify_deviations
+    except ImportError:
+        return None
+    return classify_deviations
+
+def _match_x(ideal_x, train_x):
+    """
+    Returns the positions of the training x values in the sorted ideal x values.
+    """
+    pos = np.searchsorted(ideal_x, train_x).clip(0, len(ideal_x) - 1)
+    if not np.array_equal(ideal_x[pos], train_x):
+        raise ValueError("Training data contains x values missing from the ideal functions")
+    return pos
 
 class DataLoadingException(Exception):
     """
@@ -24,6 +76,14 @@ class DataProcessor:
         Path to the test data CSV file.
     db_file : str
         Path to the SQLite database file (default is 'data.db').
+    training_df : DataFrame or None
+        Training data loaded by load_data (read-only).
+    ideal_df : DataFrame or None
+        Ideal functions data loaded by load_data (read-only).
+    results_df : DataFrame or None
+        Mapped test data produced by process_test_data (read-only).
+    best_ideal_funcs : list of str or None
+        Ideal functions selected for y1-y4 by process_test_data (read-only).
 
     Methods:
     -------
@@ -33,7 +93,11 @@ class DataProcessor:
         Creates SQLite database tables for training data, ideal functions, and test data.
     load_data():
         Loads training and ideal functions data into the database.
-    process_test_data():
+    write_table(df, table_name):
+        Replaces the rows of a database table using batched inserts.
+    compute_mse_in_db(ideal_columns):
+        Computes training/ideal mean squared errors with a single SQL query.
+    process_test_data(mse_in_db=False):
         Processes the test data and maps it to the best fitting ideal functions.
     """
     def __init__(self, training_file, ideal_functions_file, test_file, db_file='data.db'):
@@ -55,10 +119,43 @@ class DataProcessor:
         self.ideal_functions_file = ideal_functions_file
         self.test_file = test_file
         self.db_file = db_file
+        self._training_df = None
+        self._ideal_df = None
+        self._results_df = None
+        self._best_ideal_funcs = None
+
+    @property
+    def training_df(self):
+        """
+        The training data loaded by load_data, or None if it has not been loaded yet.
+        """
+        return self._training_df
+
+    @property
+    def ideal_df(self):
+        """
+        The ideal functions data loaded by load_data, or None if it has not been loaded yet.
+        """
+        return self._ideal_df
+
+    @property
+    def results_df(self):
+        """
+        The mapped test data produced by process_test_data, or None if it has not run yet.
+        """
+        return self._results_df
+
+    @property
+    def best_ideal_funcs(self):
+        """
+        The ideal functions selected for y1-y4 by process_test_data, or None if it has not run yet.
+        """
+        return self._best_ideal_funcs
 
     def load_csv_to_df(self, file):
         """
         Loads a CSV file into a pandas DataFrame and converts column names to lowercase.
+        Parsed files are cached until their modification time changes.
 
         Parameters:
         ----------
@@ -76,11 +173,11 @@ class DataProcessor:
             If there is an error loading the CSV file.
         """
         try:
-            df = pd.read_csv(file)
-            df.columns = [col.lower() for col in df.columns]  # Convert all column names to lowercase
-            print(f"Loaded data from {file}:")
-            print(df.head())  # Print the first few rows of the DataFrame for debugging
-            print(f"Columns: {df.columns.tolist()}")  # Print column names for debugging
+            # Copy the cached frame so callers can modify it freely
+            df = _load_csv(file, os.path.getmtime(file)).copy()
+            if logger.isEnabledFor(logging.DEBUG):  # Avoid formatting the preview when it is not logged
+                logger.debug("Loaded data from %s:\n%s", file, df.head())
+                logger.debug("Columns: %s", df.columns.tolist())
             return df
         except Exception as e:
             raise DataLoadingException(f"Error loading {file}: {str(e)}")
@@ -90,6 +187,17 @@ class DataProcessor:
         Creates SQLite database tables for training data, ideal functions, and test data.
         """
         engine = db.create_engine(f'sqlite:///{self.db_file}')
+
+        # Faster bulk writes; applied on connect since most of these settings are per-connection
+        @db.event.listens_for(engine, 'connect')
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute('PRAGMA temp_store=MEMORY')
+            cursor.execute('PRAGMA cache_size=-131072')
+            cursor.close()
+
         Session = sessionmaker(bind=engine)
         session = Session()
         metadata = db.MetaData()
@@ -115,6 +223,12 @@ class DataProcessor:
                              db.Column('ideal_func_no', db.Integer))
 
         metadata.create_all(engine)
+
+        # Index x for ordered scans and joins; IF NOT EXISTS also covers databases created earlier
+        with engine.begin() as conn:
+            conn.exec_driver_sql('CREATE UNIQUE INDEX IF NOT EXISTS idx_train_x ON training_data(x)')
+            conn.exec_driver_sql('CREATE UNIQUE INDEX IF NOT EXISTS idx_ideal_x ON ideal_functions(x)')
+
         self.engine = engine
         self.training_data_table = training_data
         self.ideal_functions_table = ideal_functions
@@ -125,21 +239,70 @@ class DataProcessor:
         """
         Loads training and ideal functions data into the database.
         """
-        # Load training data
-        training_data = self.load_csv_to_df(self.training_file)
+        # Load training and ideal functions data concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            training_future = executor.submit(self.load_csv_to_df, self.training_file)
+            ideal_future = executor.submit(self.load_csv_to_df, self.ideal_functions_file)
+            training_data, ideal_functions_data = training_future.result(), ideal_future.result()
         training_data.columns = ['x', 'y1', 'y2', 'y3', 'y4']
 
-        # Load ideal functions data
-        ideal_functions_data = self.load_csv_to_df(self.ideal_functions_file)
-
         # Insert into database
-        training_data.to_sql('training_data', self.engine, if_exists='replace', index=False)
-        ideal_functions_data.to_sql('ideal_functions', self.engine, if_exists='replace', index=False)
+        self.write_table(training_data, 'training_data')
+        self.write_table(ideal_functions_data, 'ideal_functions')
+
+        # Keep the loaded frames to avoid reading them back from the database
+        self._training_df = training_data
+        self._ideal_df = ideal_functions_data
+
+    def write_table(self, df, table_name):
+        """
+        Replaces the rows of a table created by create_database using batched multi-row
+        inserts in a single transaction. The table schema and its indexes are preserved.
 
-    def process_test_data(self):
+        Parameters:
+        ----------
+        df : DataFrame
+            The data to write.
+        table_name : str
+            Name of the target table.
+        """
+        chunksize = max(1, SQLITE_MAX_VARIABLES // len(df.columns))
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(f'DELETE FROM {table_name}')
+            df.to_sql(table_name, conn, if_exists='append', index=False, method='multi', chunksize=chunksize)
+
+    def compute_mse_in_db(self, ideal_columns):
+        """
+        Computes the mean squared error between every ideal function and training function
+        inside SQLite with a single aggregate query over the tables joined on x.
+
+        Parameters:
+        ----------
+        ideal_columns : list of str
+            Names of the ideal function columns to compare against.
+
+        Returns:
+        -------
+        ndarray
+            An array of shape (len(ideal_columns), 4) holding the mean squared errors.
+        """
+        aggregates = ', '.join(f'AVG((t.y{i} - f.{col}) * (t.y{i} - f.{col}))'
+                               for col in ideal_columns for i in range(1, 5))
+        query = f'SELECT {aggregates} FROM training_data t JOIN ideal_functions f USING (x)'
+        with self.engine.connect() as conn:
+            row = conn.exec_driver_sql(query).fetchone()
+        return np.array(row, dtype=np.float64).reshape(len(ideal_columns), 4)
+
+    def process_test_data(self, mse_in_db=False):
         """
         Processes the test data and maps it to the best fitting ideal functions.
 
+        Parameters:
+        ----------
+        mse_in_db : bool
+            Compute the training/ideal mean squared errors in SQLite instead of NumPy and read
+            back only the selected ideal functions (default is False).
+
         Returns:
         -------
         DataFrame
@@ -147,43 +310,67 @@ class DataProcessor:
         """
         test_data = self.load_csv_to_df(self.test_file)
 
-        # Retrieve the ideal functions
-        ideal_functions_df = pd.read_sql('SELECT * FROM ideal_functions', self.engine)
-        print("Ideal functions data loaded from the database:")
-        print(ideal_functions_df.head())  # Print the first few rows for debugging
-        print(f"Columns: {ideal_functions_df.columns.tolist()}")  # Print column names for debugging
-        ideal_functions_df.set_index('x', inplace=True)
-
-        training_data = pd.read_sql('SELECT * FROM training_data', self.engine)
-
-        # Determine the best fit for each training function
-        best_ideal_funcs = []
-        for i in range(1, 5):
-            training_col = f'y{i}'
-            min_mse = float('inf')
-            best_func = None
-            for col in ideal_functions_df.columns:
-                mse = mean_squared_error(training_data[training_col], ideal_functions_df[col])
-                if mse < min_mse:
-                    min_mse = mse
-                    best_func = col
-            best_ideal_funcs.append(best_func)
-
-        # Process each test data point
-        results = []
-        for _, row in test_data.iterrows():
-            x_val = row['x']
-            y_val = row['y']
-            best_fit = None
-            min_deviation = float('inf')
-            for idx, ideal_func in enumerate(best_ideal_funcs):
-                deviation = abs(y_val - ideal_functions_df.loc[x_val, ideal_func])
-                max_allowed_deviation = np.sqrt(2) * abs(training_data[f'y{idx+1}'] - ideal_functions_df[ideal_func]).max()
-                if deviation <= max_allowed_deviation and deviation < min_deviation:
-                    min_deviation = deviation
-                    best_fit = idx + 1
-            results.append({'x': x_val, 'y': y_val, 'delta_y': min_deviation, 'ideal_func_no': best_fit})
+        # Retrieve the training data, preferring the in-memory copy
+        if self._training_df is None:
+            self._training_df = pd.read_sql('SELECT x, y1, y2, y3, y4 FROM training_data', self.engine)
+        training_data = self._training_df
+        train_x = training_data['x'].to_numpy(dtype=np.float64)
+        train_mat = np.ascontiguousarray(training_data[['y1', 'y2', 'y3', 'y4']].to_numpy(dtype=np.float64))
+
+        # Determine the best fit for each training function, keeping only the selected ideal
+        # functions as a contiguous array sorted by x
+        if mse_in_db:
+            ideal_columns = [col.name for col in self.ideal_functions_table.columns if col.name != 'x']
+            mse = self.compute_mse_in_db(ideal_columns)
+            best_idx = mse.argmin(axis=0)
+            best_ideal_funcs = [ideal_columns[i] for i in best_idx]
+            # Read back only the selected columns; duplicates are expanded after the query
+            selected_columns = ', '.join(dict.fromkeys(best_ideal_funcs))
+            selected_df = pd.read_sql(f'SELECT x, {selected_columns} FROM ideal_functions ORDER BY x', self.engine)
+            ideal_x = selected_df['x'].to_numpy(dtype=np.float64)
+            selected_arr = np.ascontiguousarray(selected_df[best_ideal_funcs].to_numpy(dtype=np.float64))
+            pos = _match_x(ideal_x, train_x)
+        else:
+            if self._ideal_df is None:
+                self._ideal_df = pd.read_sql('SELECT * FROM ideal_functions', self.engine)
+                if logger.isEnabledFor(logging.DEBUG):  # Avoid formatting the preview when it is not logged
+                    logger.debug("Ideal functions data loaded from the database:\n%s", self._ideal_df.head())
+                    logger.debug("Columns: %s", self._ideal_df.columns.tolist())
+            ideal_functions_df = self._ideal_df.set_index('x').sort_index()
+            ideal_x = ideal_functions_df.index.to_numpy(dtype=np.float64)
+            ideal_arr = np.ascontiguousarray(ideal_functions_df.to_numpy(dtype=np.float64))
+            pos = _match_x(ideal_x, train_x)
+            ideal_mat = ideal_arr[pos]
+            diff = ideal_mat[:, :, None] - train_mat[:, None, :]
+            mse = np.einsum('ijk,ijk->jk', diff, diff) / len(train_mat)  # Shape (n_ideal, 4)
+            best_idx = mse.argmin(axis=0)
+            best_ideal_funcs = ideal_functions_df.columns[best_idx].tolist()
+            selected_arr = ideal_arr[:, best_idx]
+        self._best_ideal_funcs = best_ideal_funcs
+
+        # Maximum allowed deviation per selected ideal function, computed once for all test points
+        max_allowed = np.sqrt(2) * np.abs(train_mat - selected_arr[pos]).max(axis=0)
+
+        # Map all test data points at once
+        test_x = test_data['x'].to_numpy(dtype=np.float64)
+        test_y = test_data['y'].to_numpy(dtype=np.float64)
+        test_pos = np.searchsorted(ideal_x, test_x).clip(0, len(ideal_x) - 1)
+        aligned = selected_arr[test_pos]
+        aligned[ideal_x[test_pos] != test_x] = np.nan  # Unmatched x values get no assignment
+
+        # The fused Numba kernel only pays off for very large test files
+        kernel = _load_numba_kernel() if len(test_y) >= NUMBA_MIN_ROWS else None
+        if kernel is None:
+            kernel = _classify_deviations
+        best_fit, min_dev = kernel(aligned, test_y, max_allowed)
 
+        # Fill a preallocated record array; unassigned points keep a NaN function number
+        results = np.empty(len(test_data), dtype=[('x', 'f8'), ('y', 'f8'), ('delta_y', 'f8'), ('ideal_func_no', 'f8')])
+        results['x'] = test_x
+        results['y'] = test_y
+        results['delta_y'] = min_dev
+        results['ideal_func_no'] = np.where(best_fit < 0, np.nan, best_fit + 1)
         results_df = pd.DataFrame(results)
-        results_df.to_sql('test_data', self.engine, if_exists='replace', index=False)
+        self.write_table(results_df, 'test_data')
+        self._results_df = results_df
         return results_df
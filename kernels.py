@@ -0,0 +1,24 @@
+import numpy as np
+from numba import njit, prange
+
+@njit(parallel=True, cache=True)
+def classify_deviations(aligned, ys, max_dev):
+    """
+    Finds the closest ideal function within the allowed deviation for each test point
+    in one fused pass; unassigned points get index -1 and an infinite deviation.
+    fastmath is left off because NaN deviations of unmatched points must compare False.
+    """
+    m, k_count = aligned.shape
+    best = np.full(m, -1, np.int64)
+    delta = np.full(m, np.inf)
+    for i in prange(m):
+        best_dev = np.inf
+        best_k = -1
+        for k in range(k_count):
+            d = abs(ys[i] - aligned[i, k])
+            if d <= max_dev[k] and d < best_dev:
+                best_dev = d
+                best_k = k
+        best[i] = best_k
+        delta[i] = best_dev
+    return best, delta
@@ -25,7 +25,7 @@ def main():
     processor.process_test_data()
 
     # Initialize DataVisualizer and visualize data
-    visualizer = DataVisualizer()
+    visualizer = DataVisualizer(processor=processor)
     visualizer.visualize_data()
 
 if __name__ == "__main__":
@@ -1,4 +1,9 @@
+import os
+import tempfile
 import unittest
+import numpy as np
+import pandas as pd
+import database
 from database import DataProcessor
 
 class TestUtils(unittest.TestCase):
@@ -7,28 +12,47 @@ class TestUtils(unittest.TestCase):
 
     Methods:
     -------
-    setUp():
-        Sets up the DataProcessor instance and loads the data before each test.
+    setUpClass():
+        Sets up a shared DataProcessor instance and loads the data once for all tests.
+    tearDownClass():
+        Disposes of the database engine and removes the temporary database.
     test_load_csv_to_df():
         Tests if the CSV file is loaded into a DataFrame and is not empty.
     test_process_test_data():
         Tests if the test data is processed and results are not empty.
+    test_process_test_data_assignments():
+        Tests if the shipped data selects the expected ideal functions and assignments.
+    test_compute_mse_in_db():
+        Tests if the SQL mean squared errors match the NumPy computation.
+    test_process_test_data_mse_in_db():
+        Tests if computing the mean squared errors in SQLite gives the same results.
     """
-    def setUp(self):
+    @classmethod
+    def setUpClass(cls):
         """
-        Sets up the DataProcessor instance and loads the data before each test.
+        Sets up a shared DataProcessor instance and loads the data once for all tests.
 
-        This method is called before each test case to initialize the DataProcessor
-        with the training, ideal functions, and test data files. It also creates the
-        database and loads the data into it.
+        This method is called once before the test cases to initialize the DataProcessor
+        with the training, ideal functions, and test data files. It also creates a
+        temporary database and loads the data into it.
         """
-        self.processor = DataProcessor(
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.processor = DataProcessor(
             training_file='train.csv',
             ideal_functions_file='ideal.csv',
-            test_file='test.csv'
+            test_file='test.csv',
+            db_file=os.path.join(cls.temp_dir.name, 'data.db')
         )
-        self.processor.create_database()
-        self.processor.load_data()
+        cls.processor.create_database()
+        cls.processor.load_data()
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Disposes of the database engine and removes the temporary database.
+        """
+        cls.processor.engine.dispose()
+        cls.temp_dir.cleanup()
 
     def test_load_csv_to_df(self):
         """
@@ -51,5 +75,74 @@ class TestUtils(unittest.TestCase):
         results = self.processor.process_test_data()
         self.assertFalse(results.empty)
 
+    def test_process_test_data_assignments(self):
+        """
+        Tests if the shipped data selects the expected ideal functions and assignments.
+
+        This regression test pins the ideal functions chosen for y1-y4 and how many test
+        points are assigned to each of them when the maximum allowed deviation is taken
+        row by row over the training data.
+        """
+        results = self.processor.process_test_data()
+        self.assertEqual(self.processor.best_ideal_funcs, ['y42', 'y41', 'y11', 'y48'])
+        self.assertEqual(results['ideal_func_no'].notna().sum(), 48)
+        self.assertEqual(results['ideal_func_no'].value_counts().to_dict(), {1.0: 12, 2.0: 13, 3.0: 12, 4.0: 11})
+
+    def test_compute_mse_in_db(self):
+        """
+        Tests if the SQL mean squared errors match the NumPy computation.
+
+        This test case compares 'compute_mse_in_db' against the mean squared errors computed
+        from the loaded DataFrames and checks that both select the same ideal functions.
+        """
+        training_df = self.processor.training_df
+        ideal_df = self.processor.ideal_df.set_index('x').loc[training_df['x']]
+        train = training_df[['y1', 'y2', 'y3', 'y4']].to_numpy()
+        expected = ((ideal_df.to_numpy()[:, :, None] - train[:, None, :]) ** 2).mean(axis=0)
+
+        actual = self.processor.compute_mse_in_db(ideal_df.columns.tolist())
+        np.testing.assert_allclose(actual, expected, rtol=1e-9)
+        np.testing.assert_array_equal(actual.argmin(axis=0), expected.argmin(axis=0))
+
+    def test_process_test_data_mse_in_db(self):
+        """
+        Tests if computing the mean squared errors in SQLite gives the same results.
+
+        This test case checks that 'process_test_data' maps the test data identically
+        whether the best fitting ideal functions are selected in NumPy or in SQLite.
+        """
+        expected = self.processor.process_test_data()
+        actual = self.processor.process_test_data(mse_in_db=True)
+        pd.testing.assert_frame_equal(actual, expected)
+
+@unittest.skipIf(database._load_numba_kernel() is None, "numba is not installed")
+class TestDeviationKernels(unittest.TestCase):
+    """
+    A class to check that the Numba deviation kernel agrees with the NumPy implementation.
+
+    Methods:
+    -------
+    test_kernels_agree():
+        Tests if both implementations assign the same functions and deviations.
+    """
+    def test_kernels_agree(self):
+        """
+        Tests if both implementations assign the same functions and deviations.
+
+        The inputs cover an ordinary match, a point outside every allowed deviation and a
+        point whose x has no match in the ideal functions (NaN aligned values).
+        """
+        aligned = np.array([[1.0, 2.0, 3.0, 4.0],
+                            [10.0, 20.0, 30.0, 40.0],
+                            [np.nan, np.nan, np.nan, np.nan]])
+        ys = np.array([2.1, 100.0, 1.0])
+        max_dev = np.array([0.5, 0.5, 0.5, 0.5])
+
+        expected_best, expected_delta = database._classify_deviations(aligned, ys, max_dev)
+        best, delta = database._load_numba_kernel()(aligned, ys, max_dev)
+        np.testing.assert_array_equal(best, expected_best)
+        np.testing.assert_allclose(delta, expected_delta)
+        np.testing.assert_array_equal(best, [1, -1, -1])
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,7 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from bokeh.plotting import figure, show
-from bokeh.io import output_file
+from bokeh.plotting import figure
+from bokeh.io import output_file, save, show
 from bokeh.layouts import gridplot
+from bokeh.models import ColumnDataSource
+from bokeh.palettes import Category10
+from bokeh.transform import factor_cmap
 import sqlalchemy as db
 
 class DataVisualizer:
@@ -12,13 +16,17 @@ class DataVisualizer:
     ----------
     db_file : str
         Path to the SQLite database file (default is 'data.db').
+    processor : DataProcessor, optional
+        Processor whose in-memory data is used instead of reading from the database.
+    engine : Engine
+        SQLAlchemy engine used to read from the database.
 
     Methods:
     -------
-    visualize_data():
+    visualize_data(show_in_browser=True):
         Visualizes the training data, ideal functions, and test data.
     """
-    def __init__(self, db_file='data.db'):
+    def __init__(self, db_file='data.db', processor=None, engine=None):
         """
         Constructs all the necessary attributes for the DataVisualizer object.
 
@@ -26,43 +34,79 @@ class DataVisualizer:
         ----------
         db_file : str
             Path to the SQLite database file (default is 'data.db').
+        processor : DataProcessor, optional
+            Processor whose in-memory data is used instead of reading from the database.
+        engine : Engine, optional
+            SQLAlchemy engine to reuse; defaults to the processor's engine, or a new one
+            for db_file if neither is given.
         """
         self.db_file = db_file
+        self.processor = processor
+        if engine is None:
+            engine = getattr(processor, 'engine', None)
+        if engine is None:
+            engine = db.create_engine(f'sqlite:///{db_file}')
+        self.engine = engine
 
-    def visualize_data(self):
+    def visualize_data(self, show_in_browser=True):
         """
         Visualizes the training data, ideal functions, and test data using Bokeh.
 
-        This method reads the data from the SQLite database, creates scatter plots
-        for the training data and corresponding ideal functions, and visualizes the
+        This method reads the data from the processor or the SQLite database, creates
+        scatter plots for the training data and corresponding ideal functions, and visualizes the
         test data along with the assigned ideal functions. The resulting plots are
-        displayed in a grid layout in an HTML file.
+        arranged in a grid layout in an HTML file.
+
+        Parameters:
+        ----------
+        show_in_browser : bool
+            Open the HTML file in a browser; otherwise only save it, e.g. for headless runs
+            (default is True).
         """
-        engine = db.create_engine(f'sqlite:///{self.db_file}')
+        engine = self.engine
         output_file("visualization.html")
 
-        # Load data from the database
-        training_data = pd.read_sql('SELECT * FROM training_data', engine)
-        ideal_functions = pd.read_sql('SELECT * FROM ideal_functions', engine)
-        test_data = pd.read_sql('SELECT * FROM test_data', engine)
+        # Load data from the processor if available, otherwise read the missing tables concurrently
+        processor = self.processor
+        data = {'training_data': None, 'ideal_functions': None, 'test_data': None}
+        if processor is not None:
+            data.update(training_data=processor.training_df, ideal_functions=processor.ideal_df,
+                        test_data=processor.results_df)
+        queries = {
+            'training_data': 'SELECT x, y1, y2, y3, y4 FROM training_data',
+            'ideal_functions': 'SELECT x, y1, y2, y3, y4 FROM ideal_functions',
+            'test_data': 'SELECT x, y, ideal_func_no FROM test_data',
+        }
+        missing = [name for name, df in data.items() if df is None]
+        if missing:
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                futures = {name: executor.submit(pd.read_sql, queries[name], engine) for name in missing}
+                data.update((name, future.result()) for name, future in futures.items())
+        training_data, ideal_functions, test_data = data['training_data'], data['ideal_functions'], data['test_data']
 
         plots = []
 
-        # Create scatter plots for training data and ideal functions
+        # Create scatter plots for training data and ideal functions from shared sources
+        columns = ['x', 'y1', 'y2', 'y3', 'y4']
+        training_source = ColumnDataSource(training_data[columns])
+        ideal_source = ColumnDataSource(ideal_functions[columns])
         for i in range(1, 5):
             p = figure(title=f'Training Data Y{i} and Ideal Function', x_axis_label='x', y_axis_label='y')
-            p.scatter(training_data['x'], training_data[f'y{i}'], legend_label=f'Training y{i}', color='blue')
-            p.line(ideal_functions['x'], ideal_functions[f'y{i}'], legend_label=f'Ideal y{i}', color='red')
+            p.scatter('x', f'y{i}', source=training_source, legend_label=f'Training y{i}', color='blue')
+            p.line('x', f'y{i}', source=ideal_source, legend_label=f'Ideal y{i}', color='red')
             plots.append(p)
 
-        # Create scatter plot for test data with assigned ideal functions
+        # Create scatter plot for test data coloured by assigned ideal function
+        factors = [f'Ideal Func {i}' for i in range(1, 5)]
+        labels = test_data['ideal_func_no'].map(dict(zip(range(1, 5), factors))).fillna('Test Data')
+        test_source = ColumnDataSource(test_data[['x', 'y']].assign(label=labels))
         p = figure(title='Test Data with Assigned Ideal Functions', x_axis_label='x', y_axis_label='Y')
-        p.scatter(test_data['x'], test_data['y'], legend_label='Test Data', color='green')
-
-        for i in range(1, 5):
-            subset = test_data[test_data['ideal_func_no'] == i]
-            p.scatter(subset['x'], subset['y'], legend_label=f'Ideal Func {i}', color='blue')
+        p.scatter('x', 'y', source=test_source, legend_field='label',
+                  color=factor_cmap('label', palette=Category10[4], factors=factors, nan_color='gray'))
 
-        # Arrange the plots in a grid layout and display them
+        # Arrange the plots in a grid layout and display or save them
         grid = gridplot([[plots[0], plots[1]], [plots[2], plots[3]], [p]])
-        show(grid)
+        if show_in_browser:
+            show(grid)
+        else:
+            save(grid)